@@ -1,60 +1,70 @@
 import asyncio
-from collections import deque
 import configparser
-import csv
 from datetime import datetime
+import functools
+import json
 from typing import NamedTuple, Optional, Tuple
 import logging
-import math
+import logging.handlers
+import os
 
+import aiofiles
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import numpy as np
+import pandas as pd
 import telegram
+import telegram.request
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-TIME_TABLE = deque()
-LESSONS_LIST = deque()
-GREETINGS_LIST = deque()
+
+START_TIMES = np.empty(0, dtype="datetime64[us]")
+END_TIMES = np.empty(0, dtype="datetime64[us]")
+LESSONS_LIST = []
+DISPLAY_NAMES = []
+GREETINGS_LIST = []
 
 SUBJECTS_DICT = {}
+PHOTO_CACHE = {}
 
 
 class SubjectData (NamedTuple):
     image_path: str
-    link: deque
+    link: tuple
+
+
+class ORJSONRequest (telegram.request.HTTPXRequest):
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            raise telegram.error.TelegramError("Invalid server response") from e
 
 
 class Status:
+    __slots__ = ("is_success", "text")
+
     def __init__(self, is_success: bool, text: str):
         self.is_success = is_success
         self.text = text
 
     def log(self) -> bool:
-        if self.is_success:
-            logging.info(f"{get_current_time_text()} {self.text}")
-        else:
-            logging.error(f"{get_current_time_text()} {self.text}")
+        logging.log(logging.INFO if self.is_success else logging.ERROR, self.text)
         return self.is_success
 
 
-def get_current_period(number_of_periods: int, period_duration: int, start_of_first_period: datetime) -> int:
-    today = datetime.today()
-    days_since_start_date = (today - start_of_first_period).days
-    current_period_number = math.floor(days_since_start_date / period_duration) + 1
-    
-    for n in range(number_of_periods, 0, -1):
-        if current_period_number % n == 0 or n == 1:
-            return n
-
-
-def get_current_time_text() -> str:
-    return datetime.now().strftime("%F %T.%f")[:-3]
+OK_CONFIG = Status(True, "Config read successfully")
+OK_FILES_LOADED = Status(True, "Files were successfully loaded")
+OK_BUNDLE_LOADED = Status(True, "Schedule bundle was successfully loaded")
 
 
-def get_next_lesson_index() -> int:
-    for i, lesson in enumerate(TIME_TABLE):
-        if datetime.now() <= lesson[0] and LESSONS_LIST[i] != '':
-            return i
-    else:
-        return -1
+def get_current_period(number_of_periods: int, period_duration: int, start_of_first_period: datetime) -> int:
+    days_since_start_date = (datetime.today() - start_of_first_period).days
+    return days_since_start_date // period_duration % number_of_periods + 1
 
 
 def load_config(filename: str) -> Tuple[Optional[dict], Status]:
@@ -64,45 +74,86 @@ def load_config(filename: str) -> Tuple[Optional[dict], Status]:
     if not config.sections():
         return None, Status(False, f"Error reading configuration file: {filename}")
 
-    result = {}
-    for section in config.sections():
-        for key, value in config.items(section):
-            result[key] = value
+    result = {key: value for section in config.sections() for key, value in config[section].items()}
 
-    return result, Status(True, "Config read successfully")
+    return result, OK_CONFIG
 
 
-def load_data(subjects_path: str, period_path: str, time_table_path: str) -> Status:
+@functools.lru_cache(maxsize=1)
+def load_bundle(bundle_path: str, mtime: float) -> dict:
+    with open(bundle_path, mode='r', encoding="utf-8") as bundle_file:
+        return json.load(bundle_file)
+
+
+@functools.lru_cache(maxsize=1)
+def load_subjects(subjects_path: str, mtime: float) -> dict:
+    subjects_frame = pd.read_csv(subjects_path, header=None, dtype=str, keep_default_na=False)
+    subjects = {}
+    for row in subjects_frame.itertuples(index=False, name=None):
+        end = len(row)
+        while end > 2 and not row[end - 1]:
+            end -= 1
+        subjects[(row[0]).lower()] = SubjectData(row[1], row[2:end])
+    return subjects
+
+
+@functools.lru_cache(maxsize=1)
+def load_timetable_template(time_table_path: str, mtime: float) -> np.ndarray:
+    time_table_frame = pd.read_csv(time_table_path, header=None, dtype=str, keep_default_na=False)
+    offsets = pd.to_timedelta(time_table_frame.to_numpy().ravel()).to_numpy()
+    return offsets.reshape(time_table_frame.shape)
+
+
+def materialize_timetable(template: np.ndarray) -> None:
+    global START_TIMES, END_TIMES
+    today = np.datetime64(datetime.now().date())
+    times = (today + template).astype("datetime64[us]")
+    START_TIMES = np.ascontiguousarray(times[:, 0])
+    END_TIMES = np.ascontiguousarray(times[:, 1])
+
+
+def load_data(subjects_path: str, period_path: str, time_table_path: str,
+              bundle_path: Optional[str] = None) -> Status:
     SUBJECTS_DICT.clear()
     LESSONS_LIST.clear()
-    TIME_TABLE.clear()
+    DISPLAY_NAMES.clear()
     try:
-        with open(subjects_path, mode='r', encoding="utf-8") as subjects_file:
-            subjects_csv_reader = csv.reader(subjects_file)
-            for row in subjects_csv_reader:
-                temp = deque()
-                for i in range(2, len(row)):
-                    temp.append(row[i])
-                subject = SubjectData(row[1], temp)
-                SUBJECTS_DICT[(row[0]).lower()] = subject
-
-        with open(period_path, mode='r', encoding="utf-8") as schedule_file:
-            schedule_csv_reader = csv.reader(schedule_file)
-            for row, column in enumerate(schedule_csv_reader):
-                if row == datetime.now().weekday():
-                    LESSONS_LIST.extend(column)
-
-        with open(time_table_path, mode='r', encoding="utf-8") as time_table_file:
-            time_table_reader = csv.reader(time_table_file)
-            for row in time_table_reader:
-                row_list = deque()
-                for column in row:
-                    time_t = datetime.strptime(column, "%H:%M:%S")
-                    row_list.append(datetime.now().replace(hour=time_t.hour, minute=time_t.minute, second=time_t.second))
-                TIME_TABLE.append(row_list)
-        return Status(True, f"Files were successfully loaded")
-
-    except csv.Error as e:
+        weekday = datetime.now().weekday()
+        if bundle_path and os.path.exists(bundle_path):
+            bundle = load_bundle(bundle_path, os.path.getmtime(bundle_path))
+            try:
+                subjects_rows = bundle[os.path.basename(subjects_path)]
+                period_rows = bundle[os.path.basename(period_path)]
+                time_table_rows = bundle[os.path.basename(time_table_path)]
+            except KeyError as e:
+                logging.warning(f"Entry {e} not found in bundle {bundle_path}, falling back to CSV files")
+            else:
+                for row in subjects_rows:
+                    SUBJECTS_DICT[(row[0]).lower()] = SubjectData(row[1], tuple(row[2:]))
+
+                if weekday < len(period_rows):
+                    DISPLAY_NAMES.extend(period_rows[weekday])
+                    LESSONS_LIST.extend(name.lower() for name in DISPLAY_NAMES)
+
+                offsets = pd.to_timedelta(np.asarray(time_table_rows).ravel()).to_numpy()
+                materialize_timetable(offsets.reshape(len(time_table_rows), -1))
+                return OK_BUNDLE_LOADED
+
+        SUBJECTS_DICT.update(load_subjects(subjects_path, os.path.getmtime(subjects_path)))
+
+        try:
+            schedule_frame = pd.read_csv(period_path, header=None, dtype=str, keep_default_na=False,
+                                         skiprows=weekday, nrows=1)
+        except pd.errors.EmptyDataError:
+            schedule_frame = None
+        if schedule_frame is not None:
+            DISPLAY_NAMES.extend(schedule_frame.iloc[0].tolist())
+            LESSONS_LIST.extend(name.lower() for name in DISPLAY_NAMES)
+
+        materialize_timetable(load_timetable_template(time_table_path, os.path.getmtime(time_table_path)))
+        return OK_FILES_LOADED
+
+    except pd.errors.ParserError as e:
         return Status(False, f"Error reading CSV file: {e}")
 
     except FileNotFoundError as e:
@@ -121,20 +172,22 @@ async def delete_message(bot: telegram.Bot, message_id: int, channel_id: str) ->
         return Status(False, f"An error occurred during deleting of message: {e}")
 
 
-async def send_message(bot: telegram.Bot, subject_name: str, channel_id: str) -> \
+async def send_message(bot: telegram.Bot, subject_name: str, display_name: str, channel_id: str) -> \
         Tuple[Optional[telegram.Message], Status]:
     photo_path = None
     try:
-        subject: Optional[SubjectData] = SUBJECTS_DICT.get(subject_name.lower())
+        subject: Optional[SubjectData] = SUBJECTS_DICT.get(subject_name)
         if subject is None:
-            raise ValueError(f"Subject {subject_name} not found in SUBJECTS_DICT")
-        str_link = ''
-        for i in range(len(subject.link)):
-            str_link += f"\n{subject.link[i]}"
-        message = f"{subject_name}\n{str_link}"
+            raise ValueError(f"Subject {display_name} not found in SUBJECTS_DICT")
+        message = f"{display_name}\n" + "\n".join(subject.link)
         photo_path = subject.image_path
-        with open(photo_path, 'rb') as photo:
-            message = await bot.send_photo(channel_id, photo=photo, caption=message, read_timeout=60, write_timeout=60, connect_timeout=60)
+        photo = PHOTO_CACHE.get(photo_path)
+        if photo is None:
+            async with aiofiles.open(photo_path, 'rb') as photo_file:
+                photo = await photo_file.read()
+        message = await bot.send_photo(channel_id, photo=photo, caption=message, read_timeout=60, write_timeout=60, connect_timeout=60)
+        if message.photo:
+            PHOTO_CACHE[photo_path] = message.photo[-1].file_id
         return message, Status(True, f"Message ({message.message_id}) was successfully sent")
 
     except FileNotFoundError:
@@ -153,60 +206,80 @@ async def send_message(bot: telegram.Bot, subject_name: str, channel_id: str) ->
         return None, Status(False, f"An unknown error has occurred: {e}")
 
 
-async def main() -> None:
-    config, status = load_config("config.ini")
-    logging.basicConfig(filename="bot.log", encoding="utf-8", level=logging.DEBUG)
+async def remove_lesson(bot: telegram.Bot, send_task: asyncio.Task, channel_id: str) -> None:
+    msg, status = await send_task
+    if msg is None:
+        return
+    status = await delete_message(bot, msg.message_id, channel_id)
+    status.log()
 
-    if not status.log():
-        raise Exception(status.text)
 
-    token = config["bot_token"]
-    channel_id = config["channel_id"]
-    bot = telegram.Bot(token)
-    
-    print("Bot is running")
+async def run_lesson(scheduler: AsyncIOScheduler, bot: telegram.Bot, subject_name: str, display_name: str,
+                     channel_id: str, end_time: datetime) -> None:
+    send_task = asyncio.create_task(send_message(bot, subject_name, display_name, channel_id))
+    scheduler.add_job(remove_lesson, 'date', run_date=end_time, args=[bot, send_task, channel_id])
+    msg, status = await send_task
+    status.log()
+
 
-    current_period = get_current_period(int(config["number_of_periods"]),
-                                        int(config["period_duration"]),
-                                        datetime.strptime(config["start_of_first_period"], "%Y/%m/%d"))
+async def schedule_today(scheduler: AsyncIOScheduler, bot: telegram.Bot, config: dict, channel_id: str,
+                         number_of_periods: int, period_duration: int, start_of_first_period: datetime) -> Status:
+    current_period = get_current_period(number_of_periods, period_duration, start_of_first_period)
     status = load_data(config["subjects_dict_file_path"],
                        config["standard_period_file_path"].replace("$", str(current_period)),
-                       config["time_table_file_path"])
-
+                       config["time_table_file_path"],
+                       config.get("schedule_bundle_file_path"))
     if not status.log():
-        raise Exception(status.text)
+        return status
 
-    while True:
-        next_lesson_index = get_next_lesson_index()
+    now = datetime.now()
+    for i, subject_name in enumerate(LESSONS_LIST):
+        if subject_name == '':
+            continue
+        start_time = START_TIMES[i].item()
+        if start_time < now:
+            continue
+        scheduler.add_job(run_lesson, 'date', run_date=start_time,
+                          id=f"lesson_{i}", replace_existing=True,
+                          args=[scheduler, bot, subject_name, DISPLAY_NAMES[i], channel_id, END_TIMES[i].item()])
+    return status
 
-        if next_lesson_index < 0:
-            now = datetime.now()
-            wait_time = datetime(now.year, now.month, now.day, 8, 00) - now
 
-            await asyncio.sleep(wait_time.seconds)
+async def main() -> None:
+    config, status = load_config("config.ini")
+    file_handler = logging.FileHandler("bot.log", encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s.%(msecs)03d %(levelname)s %(message)s", datefmt="%F %T"))
+    buffer_handler = logging.handlers.MemoryHandler(capacity=64, flushLevel=logging.ERROR, target=file_handler)
+    logging.basicConfig(level=logging.DEBUG, handlers=[buffer_handler])
 
-            current_period = get_current_period(int(config["number_of_periods"]),
-                                                int(config["period_duration"]),
-                                                datetime.strptime(config["start_of_first_period"], "%Y/%m/%d"))
-            load_data(config["subjects_dict_file_path"],
-                      config["standard_period_file_path"].replace("$", str(current_period)),
-                      config["time_table_file_path"])
+    if not status.log():
+        raise Exception(status.text)
 
-        else:
-            subject = LESSONS_LIST[next_lesson_index]
-            start_time, end_time = TIME_TABLE[next_lesson_index]
+    token = config["bot_token"]
+    channel_id = config["channel_id"]
+    if orjson is None:
+        bot = telegram.Bot(token)
+    else:
+        bot = telegram.Bot(token, request=ORJSONRequest())
+    
+    print("Bot is running")
 
-            await asyncio.sleep((start_time - datetime.now()).seconds)
-            msg, status = await send_message(bot, subject, channel_id)
+    number_of_periods = int(config["number_of_periods"])
+    period_duration = int(config["period_duration"])
+    start_of_first_period = datetime.strptime(config["start_of_first_period"], "%Y/%m/%d")
 
-            if not status.log():
-                raise Exception(status.text)
+    scheduler = AsyncIOScheduler(job_defaults={"misfire_grace_time": 60})
+    scheduler.add_job(schedule_today, 'cron', hour=8, minute=0,
+                      args=[scheduler, bot, config, channel_id,
+                            number_of_periods, period_duration, start_of_first_period])
+    scheduler.start()
 
-            await asyncio.sleep((end_time - datetime.now()).seconds)
-            status = await delete_message(bot, msg.message_id, channel_id)
+    status = await schedule_today(scheduler, bot, config, channel_id,
+                                  number_of_periods, period_duration, start_of_first_period)
+    if not status.is_success:
+        raise Exception(status.text)
 
-            if not status.log():
-                raise Exception(status.text)
+    await asyncio.Event().wait()
 
 
 if __name__ == "__main__":
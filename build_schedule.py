@@ -0,0 +1,27 @@
+import configparser
+import csv
+import glob
+import json
+import os
+
+
+def pack_schedule(config_filename: str = "config.ini", bundle_path: str = "schedule/schedule.json") -> None:
+    config = configparser.ConfigParser()
+    config.read(config_filename)
+    paths = config["Paths"]
+
+    source_paths = [paths["subjects_dict_file_path"], paths["time_table_file_path"]]
+    source_paths.extend(sorted(glob.glob(paths["standard_period_file_path"].replace("$", "*"))))
+
+    bundle = {}
+    for source_path in source_paths:
+        with open(source_path, mode='r', encoding="utf-8", newline='') as source_file:
+            bundle[os.path.basename(source_path)] = list(csv.reader(source_file))
+
+    with open(bundle_path, mode='w', encoding="utf-8") as bundle_file:
+        json.dump(bundle, bundle_file, ensure_ascii=False)
+    print(f"Packed {len(source_paths)} files into {bundle_path}")
+
+
+if __name__ == "__main__":
+    pack_schedule()